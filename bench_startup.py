@@ -0,0 +1,144 @@
+"""Measures the cold start and import cost of each command.
+
+Every command is run in a fresh interpreter with -X importtime. The transport answers every request with an empty
+page instead of going to the network, so the command runs past its login into the code of the subcommand. The report
+shows the time to the first request, usually the login, which is the latency that matters when a scheduler launches a
+script just before an opening, then the imports made before it and the imports the subcommand makes after it.
+Commands that would poll forever are stopped after a number of requests. HOME is pointed at a temporary directory
+and keyring at its null backend so nothing on the machine is read or changed.
+
+    python bench_startup.py [repeats]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+COMMANDS = [
+    ('tutorial', ['--groupid', '1', '--id', 'Tutorial 01']),
+    ('tutorial', ['--sched', '--groupid', '1', '--id', 'Tutorial 01']),
+    ('librarybook', ['--dates']),
+    ('librarybook', ['--libraries']),
+    ('librarybook', ['--bookings']),
+    ('librarybook', ['--rooms']),
+    ('echodl', []),
+]
+
+FIRST_REQUEST = 'first request at '
+STOPPED = 'stopped by '
+
+# transport is patched as it is imported, by a finder ahead of the normal ones, so the runner imports nothing itself
+RUNNER = """
+import importlib.machinery, runpy, sys, time
+
+PAGE = b'<html><body><input id="logout"/><table id="btable"></table></body></html>'
+MAX_REQUESTS = 20
+made = []
+
+def fake_request(self, method, url, *args, **kwargs):
+    import requests
+
+    if not made:
+        sys.stderr.write({first!r} + repr(time.time()) + '\\n')
+    made.append(url)
+    if len(made) > MAX_REQUESTS:
+        raise SystemExit(0)
+
+    r = requests.Response()
+    r.status_code, r._content, r.encoding, r.url = 200, PAGE, 'utf-8', url
+    return r
+
+class PatchTransport:
+    def find_spec(self, name, path=None, target=None):
+        if name != 'transport':
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(name, path)
+        exec_module = spec.loader.exec_module
+
+        def patched(module):
+            exec_module(module)
+            module.Session.request = fake_request
+
+        spec.loader.exec_module = patched
+        return spec
+
+sys.meta_path.insert(0, PatchTransport())
+sys.argv = [{module!r}] + {args!r}
+try:
+    runpy.run_module({module!r}, run_name='__main__')
+except Exception as e:
+    sys.stderr.write({stopped!r} + type(e).__name__ + '\\n')
+"""
+
+
+def parse_import(line):
+    self_us, cumulative_us, name = line[len('import time:'):].split('|')
+    return int(self_us), int(cumulative_us), name.rstrip()
+
+
+def run(module, args, home):
+    env = dict(os.environ, HOME=home, WATTLE_USERNAME='u0000000',
+               PYTHON_KEYRING_BACKEND='keyring.backends.null.Keyring')
+    runner = RUNNER.format(module=module, args=args, first=FIRST_REQUEST, stopped=STOPPED)
+    start = time.time()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', runner],
+                          cwd=os.path.dirname(os.path.abspath(__file__)), env=env, stdin=subprocess.DEVNULL,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    first_request = None
+    stopped = None
+    before, after = [], []
+    errors = []
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:'):
+            if 'cumulative' not in line:
+                (after if first_request else before).append(parse_import(line))
+        elif line.startswith(FIRST_REQUEST):
+            first_request = float(line[len(FIRST_REQUEST):]) - start
+        elif line.startswith(STOPPED):
+            stopped = line[len(STOPPED):]
+        else:
+            errors.append(line)
+
+    if proc.returncode or first_request is None:
+        raise RuntimeError("{} {} failed:\n{}".format(module, " ".join(args), "\n".join(errors[-5:])))
+
+    return first_request, before, after, stopped
+
+
+def heaviest(imports, count=5):
+    # top level imports are the ones not indented under another import
+    top = sorted((i for i in imports if not i[2].startswith('  ')), key=lambda i: -i[1])[:count]
+    return ", ".join("{} {:.1f} ms".format(name.strip(), cumulative / 1000) for _, cumulative, name in top) or "-"
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for module, args in COMMANDS:
+        with tempfile.TemporaryDirectory() as home:
+            if module == 'echodl':
+                # a subscription so echodl goes on to look up a course instead of prompting for one
+                with open(os.path.join(home, '.echodlsubs.json'), 'w') as file:
+                    json.dump({'1': {'title': 'Course'}}, file)
+
+            try:
+                runs = [run(module, args, home) for _ in range(repeats)]
+            except RuntimeError as e:
+                print(e)
+                continue
+
+        first_request, before, after, stopped = min(runs, key=lambda r: r[0])
+
+        print("{} {}{}".format(module, " ".join(args), " (stopped by {})".format(stopped) if stopped else ""))
+        print("    to first request {:7.1f} ms, imports before it {:7.1f} ms".format(
+            first_request * 1000, sum(i[0] for i in before) / 1000))
+        print("        heaviest: " + heaviest(before))
+        print("    subcommand imports after it {:7.1f} ms".format(sum(i[0] for i in after) / 1000))
+        print("        heaviest: " + heaviest(after))
+
+
+if __name__ == "__main__":
+    main()
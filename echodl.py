@@ -1,10 +1,14 @@
 import datetime
+import json
+import logging
 import os
 import re
 import subprocess
 
+import requests
+
+from transport import TIMEOUTS
 from wattle import Wattle
-import dateutil.parser
 
 #TODO add ffmpeg component to normalise and compress audio OR use Dynamic Audio Normalizer filter
 #ffmpeg -i MATH1013\ -\ Week\ 1\ A.m4v -vcodec copy -ab 32 -af "dynaudnorm" MATH1013\ -\ Week\ 1\ Anorm.m4v
@@ -21,10 +25,22 @@ class Echo:
         self.wattle = wattle
         self.echoid = self.wattle.course_echo_session(courseid)
 
+        if self.echoid:
+            try:
+                self._load_course()
+            except (requests.RequestException, ValueError, KeyError, TypeError):
+                # the cached section id or session is stale, or the reply isn't section data. redo the full chain
+                logging.info("ECHO360 request failed for course id {}, refreshing session".format(courseid))
+                self.echoid = self.wattle.course_echo_session(courseid, refresh=True)
+                if self.echoid:
+                    self._load_course()
+
         if self.echoid:
             self.courseid = courseid
-            self.course_data = self._req_class()
-            self.course_name = self.course_data['section']['course']['name'].replace('/', '-')
+
+    def _load_course(self):
+        self.course_data = self._req_class()
+        self.course_name = self.course_data['section']['course']['name'].replace('/', '-')
 
     def _fix_json(self, broken):
         # the JSON returns a function call for some reason, this strips off the code and just parses the JSON
@@ -33,7 +49,8 @@ class Echo:
         return json.loads(broken[:-2])
 
     def _req_class(self, number_of_lecs=50):
-        r = self.wattle.sess.get(CLASS_DATA.format(self.echoid, number_of_lecs))
+        r = self.wattle.sess.get(CLASS_DATA.format(self.echoid, number_of_lecs), timeout=TIMEOUTS['api'])
+        r.raise_for_status()
         return self._fix_json(r.text)
 
     def lectures(self):
@@ -44,7 +61,7 @@ class Echo:
             yield lec['uuid'], lec['title']
 
     def req_lec(self, puid):
-        r = self.wattle.sess.get(LECTURE_DATA.format(self.echoid, puid))
+        r = self.wattle.sess.get(LECTURE_DATA.format(self.echoid, puid), timeout=TIMEOUTS['api'])
         return self._fix_json(r.text)
 
     def download_lecture(self, uuid, directory):
@@ -59,6 +76,8 @@ class Echo:
             letter = letter.groups()[0]
             filename = "{} - Week {:02} {}.m4v".format(self.course_name, week, letter)
         else:
+            import dateutil.parser
+
             date = dateutil.parser.parse(lec_data['presentation']['startTime'])
             filename = "{} - Week {:02} {}.m4v".format(self.course_name, week, date.strftime('%Y-%m-%d %a %H%M'))
 
@@ -79,18 +98,13 @@ class Echo:
         return proc.returncode
 
 
-if __name__ == "__main__":
-    import json
-    import logging
-    import argparse
+def notify(title, text):
+    logging.info(text)
+    os.system("""osascript -e 'display notification "{}" with title "{}"'""".format(text, title))
 
-    import prompt_toolkit
-    from tabulate import tabulate
-    import keyring
 
-    def notify(title, text):
-        logging.info(text)
-        os.system("""osascript -e 'display notification "{}" with title "{}"'""".format(text, title))
+def main():
+    import argparse
 
     subs_file = os.path.expanduser('~/.echodlsubs.json')
     echo_db_file = os.path.expanduser('~/.echodldb.json')
@@ -112,9 +126,14 @@ if __name__ == "__main__":
     if args.verbose:
         logging.basicConfig(level=logging.DEBUG)
 
+    import keyring
+
     w = Wattle(args.username, keyring.get_password('anu', args.username))
 
     if args.subscriptions or not os.path.exists(subs_file):
+        import prompt_toolkit
+        from tabulate import tabulate
+
         courses = w.courses()
         navigate = [(i, c[1]) for i, c in enumerate(courses)]
 
@@ -153,3 +172,7 @@ if __name__ == "__main__":
 
     with open(echo_db_file, "w") as file:
         json.dump(echo_db, file)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,13 @@
 import logging
+import math
 import re
 import datetime
-import intervaltree
-import requests
 import lxml.html
-import lxml.html.clean
-import dateutil.parser
 from collections import namedtuple
 
+import transport
+from transport import TIMEOUTS
+
 SITE = "https://library-admin.anu.edu.au/book-a-library-group-study-room/"
 ACTION = SITE + "index.html"
 RE_UNAVAIL = re.compile("Not available: (\\d+:\\d+) - (\\d+:\\d+)")
@@ -28,6 +28,8 @@ def time_to_interval(start, end):
 
 def parse_booking_dt(raw_dt):
     # parses datetimes in this format: Wednesday, 27 July 2016: 23:00 - 23:15
+    import dateutil.parser
+
     raw_dt = raw_dt.split(':', 1)
     d = dateutil.parser.parse(raw_dt[0])
 
@@ -40,16 +42,25 @@ def parse_booking_dt(raw_dt):
 
 class LibraryBooking:
     def __init__(self, username, password):
-        self.sess = requests.session()
-        self.cleaner = lxml.html.clean.Cleaner(forms=False)
+        self.sess = transport.Session(timeout=TIMEOUTS['page'])
+        self._cleaner = None
 
         logging.info("Logging into Library Booking Page with {}".format(username))
-        self.homepage = self.sess.post(ACTION, {'inp_uid': username, 'inp_passwd': password})
+        self.homepage = self.sess.post(ACTION, {'inp_uid': username, 'inp_passwd': password},
+                                       timeout=TIMEOUTS['login'])
 
         tree = lxml.html.fromstring(self.homepage.text)
         if not tree.xpath("//input[@id='logout']"):
             raise RuntimeError("Could not log in")
 
+    @property
+    def cleaner(self):
+        if not self._cleaner:
+            import lxml.html.clean
+
+            self._cleaner = lxml.html.clean.Cleaner(forms=False)
+        return self._cleaner
+
     def available_dates(self):
         tree = lxml.html.fromstring(self.homepage.text)
 
@@ -62,6 +73,8 @@ class LibraryBooking:
                 for lib in tree.xpath("//select[@name='building']/option") if lib.attrib['value']]
 
     def room_times(self, library, date):
+        import intervaltree
+
         if type(date) == datetime.datetime:
             date = date.date()
 
@@ -102,7 +115,7 @@ class LibraryBooking:
             "submitBooking": 1, "building": "{} Library".format(library_id), "room_no": room_id,
             "bday": date_time.date().isoformat(), "bhour": date_time.hour, "bminute": date_time.minute,
             "bookingPeriod": duration
-        })
+        }, timeout=TIMEOUTS['signup'], retries=0)
 
         tree = lxml.html.fromstring(html.text)
         table = tree.xpath("//div[@id='bookingresponse']/table/tr/td")
@@ -139,7 +152,7 @@ class LibraryBooking:
     def delete_booking(self, booking_id):
         logging.info("Deleting booking with id {}".format(booking_id))
         html = self.sess.get(ACTION, params={
-            "mycancellation": "Delete", "booking_no": booking_id})
+            "mycancellation": "Delete", "booking_no": booking_id}, timeout=TIMEOUTS['signup'], retries=0)
 
         tree = lxml.html.fromstring(html.text)
         msg = tree.xpath("//div[@id='bookingresponse']/h2")
@@ -153,20 +166,24 @@ class LibraryBooking:
         raise RuntimeError(
             "Unexpected error occurred. Cannot find delete confirmation! Response saved to error.txt")
 
-if __name__ == "__main__":
-    import argparse
-    import tabulate
-    import keyring
-    import math
-    import functools
-    import os
 
-    def draw(itree, start, end):
-        columns = []
-        for hr in range(math.floor(start), math.floor(end)):
-            columns.append("".join("·" if itree[hr + minute] else "⁕" for minute in [0, .25, .5, .75]))
+def parse_datetime(raw):
+    import dateutil.parser
+
+    return dateutil.parser.parse(raw, dayfirst=True)
+
+
+def draw(itree, start, end):
+    columns = []
+    for hr in range(math.floor(start), math.floor(end)):
+        columns.append("".join("·" if itree[hr + minute] else "⁕" for minute in [0, .25, .5, .75]))
 
-        return columns
+    return columns
+
+
+def main():
+    import argparse
+    import os
 
     parser = argparse.ArgumentParser(description='Books library rooms at the ANU libraries')
     parser.add_argument('-u', '--username', help='Wattle username to log in with')
@@ -174,7 +191,7 @@ if __name__ == "__main__":
     parser.add_argument('--dates', action='store_true', help='List dates that can be booked on')
     parser.add_argument('--bookings', action='store_true', help='List your bookings.')
     parser.add_argument('--delete', '-rm', action='store', help='Delete the specified booking id.')
-    parser.add_argument('-D', '--datetime', type=functools.partial(dateutil.parser.parse, dayfirst=True),
+    parser.add_argument('-D', '--datetime', type=parse_datetime,
                         help='Specify the date and time for the booking, such as -D "2016-07-26:14:00')
     parser.add_argument('-L', '--library', action='append', help='Specify the id of the library that the room is in')
     parser.add_argument('-R', '--room', action='append', help='Specify the priority list of room[s] to try and book')
@@ -198,6 +215,8 @@ if __name__ == "__main__":
     if args.verbose:
         logging.basicConfig(level=logging.INFO)
 
+    import keyring
+
     lb = LibraryBooking(args.username, keyring.get_password('anu', args.username))
 
     # TODO output ics file
@@ -205,6 +224,8 @@ if __name__ == "__main__":
     # TODO fix extreme-end edge case
 
     if args.libraries:
+        import tabulate
+
         print(tabulate.tabulate([list(x) for x in lb.available_libraries()],
                                 ['id', 'Library Name'], tablefmt="fancy_grid"))
 
@@ -214,6 +235,8 @@ if __name__ == "__main__":
             print(' * ', d)
 
     if args.bookings:
+        import tabulate
+
         print(tabulate.tabulate([list(x) for x in lb.my_bookings()],
                                 ['id', 'Library', 'Room', 'Booking Time', 'Duration'], tablefmt="fancy_grid"))
 
@@ -238,6 +261,9 @@ if __name__ == "__main__":
         raise parser.error("Cannot show free rooms without specifying a time.")
 
     if args.rooms:
+        import intervaltree
+        import tabulate
+
         if not args.library:
             args.library = [l[0] for l in lb.available_libraries()]
             rooms = []
@@ -274,3 +300,7 @@ if __name__ == "__main__":
 
             booking_id = lb.make_booking(library, room_id, args.datetime, args.duration)
             print("Booking successful. Booking Id: {}".format(booking_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import json
+
+import requests
+
+import echodl
+
+
+class Response:
+    def __init__(self, data, status_code=200):
+        self.text = 'EC.loadRecordsSuccess({});'.format(json.dumps(data))
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+
+class FakeWattle:
+    def __init__(self, responses):
+        self.responses = responses
+        self.refreshes = []
+        self.sess = self
+
+    def course_echo_session(self, courseid, refresh=False):
+        self.refreshes.append(refresh)
+        return 'SECTION'
+
+    def get(self, url, **kwargs):
+        return self.responses.pop(0)
+
+
+SECTION_DATA = {'section': {'course': {'name': 'COMP1100/6100'}, 'presentations': {'pageContents': []}}}
+
+
+def test_cached_session_used():
+    ed = echodl.Echo(FakeWattle([Response(SECTION_DATA)]), 1)
+    assert ed.wattle.refreshes == [False]
+    assert ed.course_name == 'COMP1100-6100'
+
+
+def test_failed_request_refreshes():
+    ed = echodl.Echo(FakeWattle([Response({}, 403), Response(SECTION_DATA)]), 1)
+    assert ed.wattle.refreshes == [False, True]
+    assert ed.course_name == 'COMP1100-6100'
+
+
+def test_wrong_payload_refreshes():
+    ed = echodl.Echo(FakeWattle([Response({'error': 'not logged in'}), Response(SECTION_DATA)]), 1)
+    assert ed.wattle.refreshes == [False, True]
+    assert ed.course_name == 'COMP1100-6100'
@@ -0,0 +1,74 @@
+import pytest
+
+import tutorial
+from tutorial import Prefetcher
+
+
+class FakeWattle:
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.calls = []
+
+    def course_signups(self, courseid):
+        self.calls.append(('signups', courseid))
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("page failed to load")
+        yield courseid * 10, "Tutorial signup"
+
+    def group_details(self, signupid):
+        self.calls.append(('group', signupid))
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("page failed to load")
+        return None, [("Tutorial 01", [], [0, 20], None, False)]
+
+
+@pytest.fixture
+def watt():
+    return FakeWattle()
+
+
+def test_signups_cached(watt):
+    prefetcher = Prefetcher(watt)
+    prefetcher.prefetch_signups(1)
+    assert prefetcher.course_signups(1) == [(10, "Tutorial signup")]
+    assert prefetcher.course_signups(1) == [(10, "Tutorial signup")]
+    assert watt.calls == [('signups', 1)]
+
+
+def test_group_details_cached(watt):
+    prefetcher = Prefetcher(watt)
+    prefetcher.prefetch_group(5)
+    assert prefetcher.group_details(5) == prefetcher.group_details(5)
+    assert watt.calls == [('group', 5)]
+
+
+def test_group_details_refetched_after_ttl(watt):
+    prefetcher = Prefetcher(watt)
+    prefetcher.group_details(5)
+
+    fetched, fut = prefetcher.details[5]
+    prefetcher.details[5] = (fetched - tutorial.GROUP_DETAILS_TTL - 1, fut)
+    prefetcher.group_details(5)
+    assert watt.calls == [('group', 5), ('group', 5)]
+
+
+def test_failed_signups_resubmitted():
+    watt = FakeWattle(fail=1)
+    prefetcher = Prefetcher(watt)
+    with pytest.raises(RuntimeError):
+        prefetcher.course_signups(1)
+
+    assert prefetcher.course_signups(1) == [(10, "Tutorial signup")]
+    assert watt.calls == [('signups', 1), ('signups', 1)]
+
+
+def test_failed_group_details_resubmitted():
+    watt = FakeWattle(fail=1)
+    prefetcher = Prefetcher(watt)
+    with pytest.raises(RuntimeError):
+        prefetcher.group_details(5)
+
+    assert prefetcher.group_details(5)[1][0][0] == "Tutorial 01"
+    assert watt.calls == [('group', 5), ('group', 5)]
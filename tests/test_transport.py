@@ -0,0 +1,102 @@
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+import transport
+
+
+class FakeRaw:
+    def __init__(self):
+        self.released = False
+
+    def release_conn(self):
+        self.released = True
+
+
+class FakeAdapter(BaseAdapter):
+    # answers each request with the next outcome, a status code or an exception to raise
+    def __init__(self, outcomes):
+        super().__init__()
+        self.outcomes = list(outcomes)
+        self.sent = []
+        self.responses = []
+
+    def send(self, request, timeout=None, **kwargs):
+        self.sent.append((request.method, timeout))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+
+        r = requests.Response()
+        r.status_code, r._content, r.raw, r.url, r.request = outcome, b'', FakeRaw(), request.url, request
+        self.responses.append(r)
+        return r
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(transport, 'backoff_delay', lambda attempt: 0)
+
+
+def session(outcomes, **kwargs):
+    sess = transport.Session(**kwargs)
+    adapter = FakeAdapter(outcomes)
+    sess.mount('http://fake/', adapter)
+    return sess, adapter
+
+
+def test_get_retried_on_server_error():
+    sess, adapter = session([503, 502, 200], retries=3)
+    assert sess.get('http://fake/page').status_code == 200
+    assert len(adapter.sent) == 3
+    assert [r.raw.released for r in adapter.responses] == [True, True, False]
+
+
+@pytest.mark.parametrize('error', [requests.ConnectionError("refused"), requests.ReadTimeout("timed out")])
+def test_get_retried_on_connection_error(error):
+    sess, adapter = session([error, 200], retries=3)
+    assert sess.get('http://fake/page').status_code == 200
+    assert len(adapter.sent) == 2
+
+
+def test_get_gives_up_after_retries():
+    sess, adapter = session([requests.ConnectionError("refused")] * 3, retries=2)
+    with pytest.raises(requests.ConnectionError):
+        sess.get('http://fake/page')
+    assert len(adapter.sent) == 3
+
+
+def test_last_server_error_returned():
+    sess, adapter = session([500, 500], retries=1)
+    assert sess.get('http://fake/page').status_code == 500
+
+
+def test_post_never_retried():
+    sess, adapter = session([503], retries=3)
+    assert sess.post('http://fake/signup', {'a': 1}).status_code == 503
+
+    sess, adapter = session([requests.ReadTimeout("timed out")], retries=3)
+    with pytest.raises(requests.ReadTimeout):
+        sess.post('http://fake/signup', {'a': 1})
+    assert len(adapter.sent) == 1
+
+
+def test_retries_zero_honoured():
+    sess, adapter = session([503], retries=3)
+    assert sess.get('http://fake/page', retries=0).status_code == 503
+    assert len(adapter.sent) == 1
+
+
+def test_timeout_default_and_override():
+    sess, adapter = session([200, 200], timeout=(1, 2))
+    sess.get('http://fake/page')
+    sess.get('http://fake/page', timeout=transport.TIMEOUTS['signup'])
+    assert [timeout for method, timeout in adapter.sent] == [(1, 2), transport.TIMEOUTS['signup']]
+
+
+def test_params_stays_positional():
+    sess, adapter = session([200])
+    assert sess.request('GET', 'http://fake/page', {'id': 1}).url == 'http://fake/page?id=1'
@@ -0,0 +1,134 @@
+import requests
+
+import tutorial
+from tutorial import SlotMatcher, tokenise
+
+
+def slot(ident, description, capacity, post_data=None, signed_up=False):
+    return ident, description, capacity, post_data, signed_up
+
+
+SLOTS = [
+    slot("Tutorial 01", ["Monday 09:00-10:00", "Room 1.23"], [20, 20], {'group': '1'}),
+    slot("Tutorial 02", ["Tuesday 2-3pm"], [5, 20], {'group': '2'}),
+    slot("Tutorial 03", ["Monday 9am"], [3, 20], {'group': '3'}),
+    slot("Lab 05", ["Tuesday 9am"], [0, 20], {'group': '5'}),
+]
+
+
+class FakeWattle:
+    def __init__(self, slots):
+        self.slots = slots
+        self.sent = []
+
+    def group_details(self, signupid, retries=None):
+        return None, self.slots
+
+    def group_send_postdata(self, signupid, post_data):
+        self.sent.append(post_data)
+
+
+def test_tokenise_normalises_days_times_and_numbers():
+    assert tokenise("Tutorial 06 Mon 9am") == tokenise("tutorial 6 monday 09:00")
+    assert tokenise("Thurs 2.30pm") == {'thu', '14:30'}
+
+
+def test_tokenise_range_carries_meridiem_to_start():
+    assert tokenise("Tue 2-3pm") == {'tue', '14:00', '15:00'}
+    assert tokenise("11-1pm") == {'11:00', '13:00'}
+    assert tokenise("12-1pm") == {'12:00', '13:00'}
+    assert tokenise("9:00 - 10:30") == {'09:00', '10:30'}
+
+
+def test_tokenise_room_numbers_are_not_times():
+    assert tokenise("Room 1.23") == {'room', '1', '23'}
+    assert tokenise("Rooms 1-2") == {'rooms', '1', '2'}
+
+
+def test_match_ranks_by_day_and_time():
+    group, score = SlotMatcher("Tue 14:00").match(SLOTS)
+    assert group[0] == "Tutorial 02"
+    assert 0 < score < 1
+
+
+def test_match_exact_identifier():
+    assert SlotMatcher("Tutorial 03").match(SLOTS) == (SLOTS[2], 1.0)
+
+
+def test_match_falls_back_to_partial_name():
+    candidates = SlotMatcher("Tut").candidates(SLOTS)
+    assert sorted(group[0] for group, score in candidates) == ["Tutorial 01", "Tutorial 02", "Tutorial 03"]
+
+
+def test_match_requires_given_day_and_time():
+    candidates = SlotMatcher("Mon 9am").candidates(SLOTS)
+    assert sorted(group[0] for group, score in candidates) == ["Tutorial 01", "Tutorial 03"]
+
+
+def test_match_drops_weak_matches():
+    candidates = SlotMatcher("tutorial 1").candidates(SLOTS)
+    assert [group[0] for group, score in candidates] == ["Tutorial 01"]
+
+
+def test_exact_identifier_is_only_match():
+    assert SlotMatcher("Tutorial 01").candidates(SLOTS) == [(SLOTS[0], 1.0)]
+
+
+def test_match_nothing():
+    assert SlotMatcher("Workshop").match(SLOTS) == (None, 0)
+
+
+def test_candidates_follow_fresh_page():
+    matcher = SlotMatcher("Mon 09:00-10:00")
+    assert matcher.match(SLOTS)[0][0] == "Tutorial 01"
+
+    fresh = [slot(ident, description, [capacity[0] - 1, capacity[1]], post_data)
+             for ident, description, capacity, post_data, signed_up in SLOTS]
+    assert matcher.match(fresh)[0] is fresh[0]
+
+
+def test_fuzzy_signup_skips_full_best_match():
+    watt = FakeWattle([slot("Tutorial 01", ["Monday 9am"], [20, 20], {'group': '1'}),
+                       slot("Tutorial 03", ["Monday 9am"], [3, 20], {'group': '3'})])
+    assert tutorial.group_fuzzy_signup(watt, 1, SlotMatcher("Mon 9am"))
+    assert watt.sent == [{'group': '3'}]
+
+
+def test_fuzzy_signup_full_identifier_never_falls_through():
+    watt = FakeWattle(SLOTS)
+    assert not tutorial.group_fuzzy_signup(watt, 1, SlotMatcher("Tutorial 01"))
+    assert watt.sent == []
+
+
+def test_fuzzy_signup_unrelated_slot_is_not_success():
+    watt = FakeWattle([SLOTS[0], slot("Tutorial 02", ["Tuesday 2-3pm"], [5, 20], {'group': '2'}, True)])
+    assert not tutorial.group_fuzzy_signup(watt, 1, SlotMatcher("Tutorial 01"))
+    assert not tutorial.group_fuzzy_signup(watt, 1, SlotMatcher("Mon 9am"))
+    assert watt.sent == []
+
+
+def test_fuzzy_signup_already_signed_up():
+    watt = FakeWattle(SLOTS[:2] + [slot("Tutorial 03", ["Monday 9am"], [3, 20], {'group': '3'}, True)])
+    assert tutorial.group_fuzzy_signup(watt, 1, SlotMatcher("Mon 9am"))
+    assert watt.sent == []
+
+
+def test_fuzzy_signup_all_full():
+    watt = FakeWattle(SLOTS[:1])
+    assert not tutorial.group_fuzzy_signup(watt, 1, SlotMatcher("Mon 09:00-10:00"))
+    assert watt.sent == []
+
+
+class FlakyWattle(FakeWattle):
+    # the sign up POST times out although it went through, the next poll shows the slot as joined
+    def group_send_postdata(self, signupid, post_data):
+        super().group_send_postdata(signupid, post_data)
+        self.slots = [slot(ident, description, capacity, post_data, signed_up or post_data == data)
+                      for ident, description, capacity, data, signed_up in self.slots]
+        raise requests.ReadTimeout("timed out")
+
+
+def test_retry_until_rechecks_after_request_error():
+    watt = FlakyWattle(SLOTS)
+    assert tutorial.retry_until(tutorial.group_signup_by_ident, watt, 1, "Tutorial 02")
+    assert watt.sent == [{'group': '2'}]
@@ -0,0 +1,111 @@
+import time
+
+import pytest
+import requests
+
+import wattle
+from wattle import Wattle
+
+MISSING = 2  # course id without an echo section
+
+
+class Page:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeSession(requests.Session):
+    # serves the Wattle -> ECHO360 login chain, the echo login sets a session cookie like ECHO360 does
+    def __init__(self, cookie_expires=None):
+        super().__init__()
+        self.cookie_expires = cookie_expires
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        if url.startswith(wattle.COURSE.format('')):
+            courseid = url.rsplit('=', 1)[1]
+            return Page('<div class="block_echo360_echocenter"><a href="{}/blocks/echo360/{}">Echo</a></div>'.format(
+                wattle.SITE, courseid))
+        if '/blocks/echo360/' in url:
+            courseid = url.rsplit('/', 1)[1]
+            return Page('<iframe src="https://capture.anu.edu.au:8443/ess/lti/{}"></iframe>'.format(courseid))
+        if '/ess/lti/' in url:
+            courseid = url.rsplit('/', 1)[1]
+            if int(courseid) == MISSING:
+                return Page('<p>Missing course section</p>')
+            self.cookies.set('JSESSIONID', 'echo-' + courseid, domain='capture.anu.edu.au', path='/ess',
+                             expires=self.cookie_expires)
+            return Page('<iframe src="/ess/client/section/SECTION{}?apiUrl=x"></iframe>'.format(courseid))
+        return Page('<p>ok</p>')
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / 'echo_cache.json')
+
+
+def new_wattle(monkeypatch, cache_file, cookie_expires=None):
+    monkeypatch.setattr(Wattle, 'login', lambda self: setattr(self, 'sess', FakeSession(cookie_expires)))
+    return Wattle('u0000000', 'password', echo_cache=cache_file)
+
+
+def test_second_run_skips_login_chain(monkeypatch, cache_file):
+    first = new_wattle(monkeypatch, cache_file)
+    assert first.course_echo_session(1) == 'SECTION1'
+    assert len(first.sess.urls) == 4
+
+    second = new_wattle(monkeypatch, cache_file)
+    assert second.course_echo_session(1) == 'SECTION1'
+    assert second.sess.urls == []
+    assert second.sess.cookies.get('JSESSIONID', domain='capture.anu.edu.au', path='/ess') == 'echo-1'
+
+
+def test_only_echo_cookies_are_cached(monkeypatch, cache_file):
+    w = new_wattle(monkeypatch, cache_file)
+    w.sess.cookies.set('MoodleSession', 'wattle', domain='wattlecourses.anu.edu.au')
+    w.course_echo_session(1)
+    assert [c['name'] for c in w.echo_cache['1']['cookies']] == ['JSESSIONID']
+
+
+def test_missing_section_cached_negatively(monkeypatch, cache_file):
+    assert new_wattle(monkeypatch, cache_file).course_echo_session(MISSING) is None
+
+    w = new_wattle(monkeypatch, cache_file)
+    assert w.course_echo_session(MISSING) is None
+    assert w.sess.urls == []
+
+
+def test_missing_section_rechecked_after_ttl(monkeypatch, cache_file):
+    new_wattle(monkeypatch, cache_file).course_echo_session(MISSING)
+
+    w = new_wattle(monkeypatch, cache_file)
+    w.echo_cache[str(MISSING)]['time'] -= wattle.ECHO_CACHE_MISSING_TTL + 1
+    w.course_echo_session(MISSING)
+    assert len(w.sess.urls) == 3
+
+
+def test_section_refreshed_after_ttl(monkeypatch, cache_file):
+    new_wattle(monkeypatch, cache_file).course_echo_session(1)
+
+    w = new_wattle(monkeypatch, cache_file)
+    w.echo_cache['1']['time'] -= wattle.ECHO_CACHE_TTL + 1
+    assert w.course_echo_session(1) == 'SECTION1'
+    assert len(w.sess.urls) == 4
+
+
+def test_expired_cookie_refreshes(monkeypatch, cache_file):
+    new_wattle(monkeypatch, cache_file, cookie_expires=int(time.time()) + 60).course_echo_session(1)
+
+    w = new_wattle(monkeypatch, cache_file)
+    w.echo_cache['1']['cookies'][0]['expires'] = int(time.time()) - 1
+    w.course_echo_session(1)
+    assert len(w.sess.urls) == 4
+
+
+def test_refresh_runs_chain(monkeypatch, cache_file):
+    new_wattle(monkeypatch, cache_file).course_echo_session(1)
+
+    w = new_wattle(monkeypatch, cache_file)
+    assert w.course_echo_session(1, refresh=True) == 'SECTION1'
+    assert len(w.sess.urls) == 4
@@ -0,0 +1,84 @@
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# seconds for (connect, read), pass the one for the operation as timeout= to the session calls
+TIMEOUTS = {
+    'default': (5, 30),
+    'login': (5, 20),
+    'page': (5, 20),
+    'signup': (3, 10),
+    'api': (5, 30),
+}
+
+POOL_CONNECTIONS = 4  # number of hosts to keep pools for
+POOL_MAXSIZE = 16  # connections kept per host, enough for the concurrent prefetching
+RETRIES = 3
+BACKOFF = 0.5  # base delay in seconds, doubled every attempt with up to 100% jitter added
+RETRY_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+RETRY_STATUS = {500, 502, 503, 504}
+
+
+def backoff_delay(attempt, base=BACKOFF):
+    delay = base * (2 ** attempt)
+    return delay + random.uniform(0, delay)
+
+
+class Session(requests.Session):
+    # requests session with sized connection pools, a default timeout and retries of idempotent requests.
+    # POSTs are never retried as a repeated sign up or booking request is not safe, pass retries=0 for GETs
+    # that change something too.
+    def __init__(self, timeout=TIMEOUTS['default'], retries=RETRIES, pool_connections=POOL_CONNECTIONS,
+                 pool_maxsize=POOL_MAXSIZE):
+        super().__init__()
+        self.timeout = timeout
+        self.retries = retries
+
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, *args, retries=None, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if method.upper() not in RETRY_METHODS:
+            retries = 0
+        elif retries is None:
+            retries = self.retries
+
+        for attempt in range(retries + 1):
+            try:
+                r = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == retries:
+                    raise
+                logging.info("{} {} failed ({}), retrying".format(method, url, e))
+            else:
+                if r.status_code not in RETRY_STATUS or attempt == retries:
+                    return r
+                logging.info("{} {} returned {}, retrying".format(method, url, r.status_code))
+                r.close()  # hand the connection back to the pool
+
+            time.sleep(backoff_delay(attempt))
+
+    def warm(self, url, connections=1):
+        # opens the TCP/TLS connections to the host of url ahead of a time critical burst of requests. the
+        # connections are made concurrently on background threads so they all end up in the pool, and this returns
+        # straight away so a slow server can't hold up the caller.
+        base = "{0.scheme}://{0.netloc}/".format(urlparse(url))
+        logging.info("Warming {} connection(s) to {}".format(connections, base))
+
+        def head():
+            try:
+                self.head(base, timeout=TIMEOUTS['signup'], retries=0, allow_redirects=False)
+            except requests.RequestException as e:
+                logging.info("Could not warm connection to {}: {}".format(base, e))
+
+        threads = [threading.Thread(target=head, daemon=True) for _ in range(connections)]
+        for t in threads:
+            t.start()
+        return threads
@@ -1,18 +1,131 @@
 import re
 import logging
 import argparse
-import wattle
-import keyring
+import difflib
 import os
 import time
 import sched
 
-# TODO dateutil.parser has fuzzy date parsing for tutorial times
-# TODO use fuzzywuzzy for fuzzy string matching of tutorial names
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+# a time range such as "2-3pm" or "9:00 - 10:30", checked in _normalise_range before it is treated as times
+RE_RANGE = re.compile("\\b(\\d{1,2})(?:([:.])(\\d{2}))?\\s*(am|pm)?\\s*[-–]\\s*"
+                      "(\\d{1,2})(?:([:.])(\\d{2}))?\\s*(am|pm)?\\b")
+# a single time, "." only separates hours and minutes when am/pm follows so "Room 1.23" isn't a time
+RE_TIME = re.compile("\\b(\\d{1,2})(?::(\\d{2})\\s*(am|pm)?|\\.(\\d{2})\\s*(am|pm)|\\s*(am|pm))\\b")
+RE_TOKEN = re.compile("[a-z0-9:]+")
+RE_CLOCK = re.compile("\\d{2}:\\d{2}$")
+MATCH_MARGIN = 0.1  # slots scoring further than this below the best match are not accepted
+POLL_INTERVAL = 0.5  # seconds between checks for a signup page to appear
+GROUP_DETAILS_TTL = 30  # seconds before a prefetched group page is considered stale
+
+scheduler = sched.scheduler(time.time, time.sleep)
+
+
+def _clock(hour, minute, meridiem):
+    if meridiem == 'pm' and hour < 12:
+        hour += 12
+    elif meridiem == 'am' and hour == 12:
+        hour = 0
+    return "{:02}:{:02}".format(hour, minute)
+
+
+def _normalise_range(match):
+    start_hour, start_sep, start_min, start_mer, end_hour, end_sep, end_min, end_mer = match.groups()
+    seps = {start_sep, end_sep} - {None}
+    if not (':' in seps or end_mer) or ('.' in seps and not end_mer):
+        return match.group(0)  # not a time range, e.g. "1-2" or "1.23-1.24"
+
+    start_hour, end_hour = int(start_hour), int(end_hour)
+    if not start_mer and end_mer:
+        # "2-3pm" is 14:00-15:00 but "11-1pm" starts in the morning
+        start_mer = end_mer
+        if end_mer == 'pm' and start_hour % 12 > end_hour % 12:
+            start_mer = 'am'
+
+    return " {} {} ".format(_clock(start_hour, int(start_min or 0), start_mer),
+                            _clock(end_hour, int(end_min or 0), end_mer))
+
+
+def _normalise_time(match):
+    hour, minute = int(match.group(1)), int(match.group(2) or match.group(4) or 0)
+    return " {} ".format(_clock(hour, minute, match.group(3) or match.group(5) or match.group(6)))
+
+
+def tokenise(text):
+    # lower cases, converts times to 24 hour HH:MM, day names to three letters and strips leading zeros off numbers
+    # so "Tutorial 06 Mon 9am" and "tutorial 6 monday 09:00" give the same tokens
+    text = RE_RANGE.sub(_normalise_range, text.lower())
+    text = RE_TIME.sub(_normalise_time, text)
+    tokens = set()
+    for token in RE_TOKEN.findall(text):
+        day = [d for d in DAYS if len(token) >= 3 and d.startswith(token)]
+        if day:
+            token = day[0][:3]
+        elif token.isdigit():
+            token = str(int(token))
+        tokens.add(token)
+    return tokens
+
+
+class SlotMatcher:
+    # ranks the slots of a group page against a fuzzy name. the slot text is tokenised once, later calls only look
+    # up the ranked slots in the fresh page so the current capacity and sign up button can be checked.
+    def __init__(self, name):
+        self.name = name
+        self.tokens = tokenise(name)
+        # every day and time given must appear in a slot for it to match
+        self.when = set(t for t in self.tokens if t in [d[:3] for d in DAYS] or RE_CLOCK.match(t))
+        try:
+            self.pattern = re.compile(name, re.IGNORECASE)
+        except re.error:
+            self.pattern = re.compile(re.escape(name), re.IGNORECASE)
+        self.identifiers = None
+        self.ranked = []
+
+    def _rank(self, slots):
+        # a name that is exactly a slot identifier only ever matches that slot
+        if any(slot[0] == self.name for slot in slots):
+            return [(1.0, self.name)]
+
+        ranked = []
+        for ident, description, capacity, post_data, signed_up in slots:
+            text = " ".join([ident] + description)
+            tokens = tokenise(text)
+            if not self.when <= tokens:
+                continue
+
+            overlap = len(self.tokens & tokens) / len(self.tokens) if self.tokens else 0
+            if self.pattern.search(text):
+                # partial names such as "Tut" still match as they did with re.search
+                overlap = max(overlap, 0.5)
+            if not overlap:
+                continue
+            ratio = difflib.SequenceMatcher(None, self.name.lower(), text.lower()).ratio()
+            ranked.append((0.9 * overlap + 0.1 * ratio, ident))
+
+        ranked.sort(key=lambda r: -r[0])
+        return [r for r in ranked if r[0] >= ranked[0][0] - MATCH_MARGIN]
+
+    def candidates(self, slots):
+        # the matching slots of a fresh page, best first, as (slot, score)
+        identifiers = [slot[0] for slot in slots]
+        if identifiers != self.identifiers:
+            self.ranked = self._rank(slots)
+            self.identifiers = identifiers
+            if self.ranked:
+                logging.info("Best match for \"{}\" is \"{}\" with score {:.2f}".format(
+                    self.name, self.ranked[0][1], self.ranked[0][0]))
+
+        by_ident = dict((slot[0], slot) for slot in slots)
+        return [(by_ident[ident], score) for score, ident in self.ranked]
+
+    def match(self, slots):
+        candidates = self.candidates(slots)
+        return candidates[0] if candidates else (None, 0)
 
 
 def group_signup_by_ident(watt, signupid, identifier):
-    open_dt, group_details = watt.group_details(signupid=signupid)
+    open_dt, group_details = watt.group_details(signupid=signupid, retries=0)
     for group in group_details:
         ident, description, capacity, post_data, signed_up = group
 
@@ -32,23 +145,47 @@ def group_signup_by_ident(watt, signupid, identifier):
     return False
 
 
-def group_fuzzy_signup(watt, signupid, name):
-    open_dt, group_details = watt.group_details(signupid=signupid)
-    for group in group_details:
-        ident, description, capacity, post_data, signed_up = group
+def group_fuzzy_signup(watt, signupid, matcher):
+    open_dt, group_details = watt.group_details(signupid=signupid, retries=0)
+    candidates = matcher.candidates(group_details)
+    if not candidates:
+        logging.info("No tutorial slot matches \"{}\"".format(matcher.name))
+        return False
 
-        desc_match = [re.search(name, ident) for ident in description]
-        if re.search(name, ident) or any(desc_match):
-            if signed_up:
-                logging.info("Already signed up for group for group id {}".format(signupid))
-                return True
+    if any(group[4] for group, score in candidates):
+        logging.info("Already signed up for group for group id {}".format(signupid))
+        return True
 
-            if post_data:
-                watt.group_send_postdata(signupid, post_data)
+    # join the best ranked slot that still has space
+    for group, score in candidates:
+        ident, description, capacity, post_data, signed_up = group
+        if post_data and capacity[0] < capacity[1]:
+            logging.info("Joining \"{}\" (score {:.2f}) with capacity {}/{}".format(
+                ident, score, capacity[0], capacity[1]))
+            watt.group_send_postdata(signupid, post_data)
+            return True
 
     return False
 
 
+def retry_until(check, *args, interval=0):
+    # calls check until it returns something true and returns that. a failed or timed out request is logged and
+    # the next call fetches the page again, which also shows whether a sign up whose response never arrived went
+    # through.
+    import requests
+
+    while True:
+        try:
+            result = check(*args)
+            if result:
+                return result
+        except requests.RequestException as e:
+            logging.warning("Request failed ({}), checking again".format(e))
+
+        if interval:
+            time.sleep(interval)
+
+
 def auto_signup(watt, signupid, ident, schedule=False):
     if schedule:
         open_dt, group_details = watt.group_details(signupid=signupid)
@@ -61,26 +198,25 @@ def auto_signup(watt, signupid, ident, schedule=False):
             # chances are we will to relog into wattle
             scheduler.enterabs(start_time - 20, 1, lambda w: w.login(), (watt,))
 
+        scheduler.enterabs(start_time - 5, 1, lambda w: w.warm(), (watt,))
+
         scheduler.enterabs(start_time - 3, 1, auto_signup, (watt, signupid, ident))
         logging.info("Scheduled to start in {} seconds for signup at {}.".format(start_time - time.time(), open_dt))
         scheduler.run()
     else:
-        while True:
-            if group_signup_by_ident(watt, signupid, ident):
-                break
+        retry_until(group_signup_by_ident, watt, signupid, ident)
 
 
-def auto_fuzzy_signup(watt, courseid, ident):
-    signupid = None
+def first_signup(watt, courseid):
+    su = list(watt.course_signups(courseid, retries=0))
+    return su[0][0] if su else None
 
-    while not signupid:
-        su = list(watt.course_signups(courseid))
-        if su:
-            signupid = su[0][0]
 
-    while True:
-        if group_fuzzy_signup(watt, signupid, ident):
-            break
+def auto_fuzzy_signup(watt, courseid, ident):
+    signupid = retry_until(first_signup, watt, courseid, interval=POLL_INTERVAL)
+
+    matcher = SlotMatcher(ident)
+    retry_until(group_fuzzy_signup, watt, signupid, matcher, interval=POLL_INTERVAL)
 
 
 def leave(watt, signupid, group_details):
@@ -104,7 +240,7 @@ def leave(watt, signupid, group_details):
 
 
 def watch(watt, signupid, identifier):
-    open_dt, group_details = watt.group_details(signupid=signupid)
+    open_dt, group_details = watt.group_details(signupid=signupid, retries=0)
     for group in group_details:
         ident, description, capacity, post_data, signed_up = group
 
@@ -129,47 +265,70 @@ def watch(watt, signupid, identifier):
                     return group_signup_by_ident(watt, signupid, ident)
 
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+class Prefetcher:
+    # loads wattle pages in the background so each screen of the UI can be shown without waiting
+    def __init__(self, watt, workers=8):
+        from concurrent.futures import ThreadPoolExecutor
 
-parser = argparse.ArgumentParser(description='Automatically signs up to groups on Wattle')
-parser.add_argument('--groupid', type=int, help='Specify the group ID to sign up for')
-parser.add_argument('--id', help='The tutorial slot to sign up for (the string identifier from the group select page')
-parser.add_argument('--watch', action='store_true', help='Watch a slot to free up.')
-parser.add_argument('--sched', action='store_true', help='Enable scheduling.')
-parser.add_argument('--UI', action='store_true', help='Use terminal UI.')
-parser.add_argument('-u', '--username', help='Wattle username to log in with')
+        self.watt = watt
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.signups = {}
+        self.details = {}
 
-args = parser.parse_args()
-scheduler = sched.scheduler(time.time, time.sleep)
+    def prefetch_signups(self, courseid):
+        fut = self.signups.get(courseid)
+        if not fut or (fut.done() and fut.exception()):
+            fut = self.pool.submit(lambda: list(self.watt.course_signups(courseid)))
+            self.signups[courseid] = fut
+        return fut
 
-if not args.username:
-    if 'WATTLE_USERNAME' not in os.environ:
-        parser.error("No Wattle username was provided, can't log in!")
-    else:
-        args.username = os.environ['WATTLE_USERNAME']
+    def prefetch_group(self, signupid):
+        fetched, fut = self.details.get(signupid, (0, None))
+        if not fut or time.time() - fetched > GROUP_DETAILS_TTL or (fut.done() and fut.exception()):
+            fut = self.pool.submit(self.watt.group_details, signupid)
+            self.details[signupid] = (time.time(), fut)
+        return fut
+
+    def course_signups(self, courseid):
+        return self.prefetch_signups(courseid).result()
+
+    def group_details(self, signupid):
+        return self.prefetch_group(signupid).result()
+
+
+def slot2ident(groups):
+    for grp in groups:
+        identifier, description, capacity, post_data, signed_up = grp
+        yield (identifier, "{}: {} {}/{}".format(identifier, description, capacity[0], capacity[1]))
 
-w = wattle.Wattle(args.username, keyring.get_password('anu', args.username))
 
-if args.UI:
+def select_ui(watt):
+    # terminal UI to pick course -> group -> slot, returns the group id and slot identifier chosen
     import npyscreen
 
-    def slot2ident(groups):
-        for grp in groups:
-            identifier, description, capacity, post_data, signed_up = grp
-            yield (identifier, "{}: {} {}/{}".format(identifier, description, capacity[0], capacity[1]))
+    class PrefetchSelectOne(npyscreen.TitleSelectOne):
+        def when_cursor_moved(self):
+            self.parent.highlighted(self.entry_widget.cursor_line)
 
     class PopulateSelector(npyscreen.ActionForm):
         def create(self):
             self.value = None
             self.populate = None
-            self.ms = self.add(npyscreen.TitleSelectOne, value=[0, ], name="Select",
+            self.prefetch = None
+            self.options = []
+            self.ms = self.add(PrefetchSelectOne, value=[0, ], name="Select",
                  values=[], scroll_exit=True)
 
         def beforeEditing(self):
             self.options = self.populate()
             self.ms.values = [op for i, op in self.options]
+            self.highlighted(0)
             self.parentApp.setNextForm(self.parentApp.form_order.pop(0))
 
+        def highlighted(self, index):
+            if self.prefetch and 0 <= index < len(self.options):
+                self.prefetch(self.options[index][0])
+
         def on_ok(self):
             self.value = self.options[self.ms.value[0]][0]
 
@@ -178,22 +337,59 @@ if args.UI:
             self.addForm("MAIN", PopulateSelector)
             self.addForm("GROUPSELECT", PopulateSelector)
             self.addForm("TIMESELECT", PopulateSelector)
-            self.getForm("MAIN").populate = lambda: w.courses()
-            self.getForm("GROUPSELECT").populate = lambda: list(w.course_signups(self.getForm("MAIN").value))
-            self.getForm("TIMESELECT").populate = lambda: list(slot2ident(w.group_details(self.getForm("GROUPSELECT").value)[1]))
+
+            courses = watt.courses()
+            for course_id, title in courses:
+                prefetcher.prefetch_signups(course_id)
+
+            self.getForm("MAIN").populate = lambda: courses
+            self.getForm("GROUPSELECT").populate = lambda: prefetcher.course_signups(self.getForm("MAIN").value)
+            self.getForm("GROUPSELECT").prefetch = prefetcher.prefetch_group
+            self.getForm("TIMESELECT").populate = lambda: list(slot2ident(
+                prefetcher.group_details(self.getForm("GROUPSELECT").value)[1]))
             self.form_order = ['GROUPSELECT', 'TIMESELECT', None]
 
+    prefetcher = Prefetcher(watt)
     myApp = SelectorUI()
     myApp.run()
-    args.id = myApp.getForm("TIMESELECT").value
-    args.groupid = myApp.getForm("GROUPSELECT").value
-
-if args.id and args.groupid:
-    if args.watch:
-        while True:
-            if watch(w, args.groupid, args.id):
-                break
-            else:
-                time.sleep(60)
-    else:
-        auto_signup(w, args.groupid, args.id, args.sched)
+    # drop prefetches that are still queued so they do not compete with the sign up requests
+    prefetcher.pool.shutdown(wait=False, cancel_futures=True)
+    return myApp.getForm("GROUPSELECT").value, myApp.getForm("TIMESELECT").value
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    parser = argparse.ArgumentParser(description='Automatically signs up to groups on Wattle')
+    parser.add_argument('--groupid', type=int, help='Specify the group ID to sign up for')
+    parser.add_argument('--id', help='The tutorial slot to sign up for (the string identifier from the group select page')
+    parser.add_argument('--watch', action='store_true', help='Watch a slot to free up.')
+    parser.add_argument('--sched', action='store_true', help='Enable scheduling.')
+    parser.add_argument('--UI', action='store_true', help='Use terminal UI.')
+    parser.add_argument('-u', '--username', help='Wattle username to log in with')
+
+    args = parser.parse_args()
+
+    if not args.username:
+        if 'WATTLE_USERNAME' not in os.environ:
+            parser.error("No Wattle username was provided, can't log in!")
+        else:
+            args.username = os.environ['WATTLE_USERNAME']
+
+    import keyring
+    import wattle
+
+    w = wattle.Wattle(args.username, keyring.get_password('anu', args.username))
+
+    if args.UI:
+        args.groupid, args.id = select_ui(w)
+
+    if args.id and args.groupid:
+        if args.watch:
+            retry_until(watch, w, args.groupid, args.id, interval=60)
+        else:
+            auto_signup(w, args.groupid, args.id, args.sched)
+
+
+if __name__ == "__main__":
+    main()
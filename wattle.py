@@ -1,29 +1,44 @@
-import requests
 import lxml.html
 import logging
-import dateutil.parser
+import json
+import os
 import re
+import time
 from urllib.parse import urlparse
 
+import transport
+from transport import TIMEOUTS
+
 SITE = "https://wattlecourses.anu.edu.au"
 COURSE = SITE + "/course/view.php?id={}"
 GROUP = SITE + "/mod/groupselect/view.php?id={}"
 GROUP_VIEW = SITE + "/mod/groupselect/view.php"
 
+ECHO_CACHE = os.path.expanduser('~/.wattle_echo_cache.json')
+ECHO_CACHE_TTL = 60*60*24*120  # echo section ids are stable for a semester, the login cookies are kept until they expire
+ECHO_CACHE_MISSING_TTL = 60*60*24  # recheck courses without a section daily
+
 
 class Wattle:
-    def __init__(self, username, password):
+    def __init__(self, username, password, echo_cache=ECHO_CACHE):
         self.username = username
         self.password = password
+        self.echo_cache_file = echo_cache
+        self.echo_cache = self._load_echo_cache()
 
         self.login()
 
     def login(self):
-        self.sess = requests.session()
+        self.sess = transport.Session(timeout=TIMEOUTS['page'])
 
         logging.info("Logging into WATTLE with {}".format(self.username))
         self.homepage = self.sess.post(SITE + "/login/index.php",
-                                       {'username': self.username, 'password': self.password, 'rememberusername': 0})
+                                       {'username': self.username, 'password': self.password, 'rememberusername': 0},
+                                       timeout=TIMEOUTS['login'])
+
+    def warm(self, connections=2):
+        # call shortly before a sign up opens so the requests don't wait on new TCP/TLS connections
+        self.sess.warm(SITE, connections)
 
     def courses(self):
         tree = lxml.html.fromstring(self.homepage.text)
@@ -37,7 +52,60 @@ class Wattle:
 
         return out
 
-    def course_echo_session(self, courseid):
+    def _load_echo_cache(self):
+        if not self.echo_cache_file or not os.path.exists(self.echo_cache_file):
+            return {}
+
+        try:
+            with open(self.echo_cache_file, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            logging.warning("Ignoring unreadable ECHO360 cache {}".format(self.echo_cache_file))
+            return {}
+
+    def _save_echo_cache(self):
+        if not self.echo_cache_file:
+            return
+
+        # the cache holds ECHO360 session cookies so keep it private
+        fd = os.open(self.echo_cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as file:
+            json.dump(self.echo_cache, file)
+
+    def _echo_cookies(self, host):
+        return [{'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path, 'expires': c.expires,
+                 'secure': c.secure}
+                for c in self.sess.cookies if host.endswith(c.domain.lstrip('.'))]
+
+    def _echo_cache_valid(self, entry):
+        if not entry['echo_id']:
+            return time.time() - entry['time'] < ECHO_CACHE_MISSING_TTL
+
+        if 'cookies' not in entry or time.time() - entry['time'] >= ECHO_CACHE_TTL:
+            return False
+        return not any(c['expires'] and c['expires'] <= time.time() for c in entry['cookies'])
+
+    def course_echo_session(self, courseid, refresh=False):
+        # the echo section id and the ECHO360 login cookies are cached, a cached None means the course has no echo
+        # section. pass refresh=True to run the full login chain again, such as when an API call with the cached
+        # session fails.
+        entry = self.echo_cache.get(str(courseid))
+        if entry and not refresh and self._echo_cache_valid(entry):
+            logging.info("Using cached ECHO360 section for course id {}".format(courseid))
+            for c in entry.get('cookies', []):
+                self.sess.cookies.set(c['name'], c['value'], domain=c['domain'], path=c['path'],
+                                      expires=c['expires'], secure=c['secure'])
+            return entry['echo_id']
+
+        echo_id, echo_host = self._resolve_echo_session(courseid)
+        entry = {'echo_id': echo_id, 'time': time.time()}
+        if echo_id:
+            entry['cookies'] = self._echo_cookies(echo_host)
+        self.echo_cache[str(courseid)] = entry
+        self._save_echo_cache()
+        return echo_id
+
+    def _resolve_echo_session(self, courseid):
         logging.info("Getting ECHO360 landing page for course id {}".format(courseid))
         p = self.sess.get(COURSE.format(courseid))
         tree = lxml.html.fromstring(p.text)
@@ -52,17 +120,17 @@ class Wattle:
         tree = lxml.html.fromstring(p.text)
 
         if "Missing course section" in p.text:
-            return None
+            return None, None
 
         echourl2 = tree.xpath("//iframe")[0].attrib['src']  # partial URL
         logging.info("Sending 2nd round ECHO360 login")
         p = self.sess.get(url.scheme + "://" + url.netloc + echourl2)
 
         echo_id = re.search("/section/(.*?)\\?api", echourl2).groups()[0]
-        return echo_id
+        return echo_id, url.hostname
 
-    def course_signups(self, courseid):
-        p = self.sess.get(COURSE.format(courseid))
+    def course_signups(self, courseid, retries=None):
+        p = self.sess.get(COURSE.format(courseid), retries=retries)
         tree = lxml.html.fromstring(p.text)
 
         sign_ups = tree.xpath('//li[contains(concat(" ", normalize-space(@class), " "), " groupselect ")]')
@@ -72,14 +140,17 @@ class Wattle:
             title = su.xpath('.//span[@class="instancename"]')[0].text
             yield group_id, title
 
-    def group_details(self, signupid):
+    def group_details(self, signupid, retries=None):
+        # pass retries=0 when polling in a loop that retries by itself
         logging.info("Getting group sign up details for id {}".format(signupid))
-        p = self.sess.get(GROUP.format(signupid))
+        p = self.sess.get(GROUP.format(signupid), retries=retries)
         tree = lxml.html.fromstring(p.text)
 
         open_time = tree.xpath("//section[@id='region-main']/div/div[@role='alert']")
 
         if open_time:
+            import dateutil.parser
+
             raw_time = open_time[0][0].tail.strip()
             open_dt = dateutil.parser.parse(raw_time, fuzzy=True)
         else:
@@ -109,7 +180,7 @@ class Wattle:
 
     def group_send_postdata(self, signupid, post_data):
         logging.info("Sending post data id {}".format(signupid))
-        p = self.sess.post(GROUP_VIEW.format(signupid), post_data)
+        p = self.sess.post(GROUP_VIEW.format(signupid), post_data, timeout=TIMEOUTS['signup'])
         tree = lxml.html.fromstring(p.text)
 
         if tree.xpath("//form[@class='mform']"):
@@ -121,5 +192,5 @@ class Wattle:
             post_data = dict((field.attrib['name'], field.value)
                              for field in signupvals if 'name' in field.attrib)
             logging.info("Sending confirmation".format(signupid))
-            p = self.sess.post(GROUP_VIEW.format(signupid), post_data)
+            p = self.sess.post(GROUP_VIEW.format(signupid), post_data, timeout=TIMEOUTS['signup'])
             return p